@@ -1,14 +1,21 @@
+import gzip
+import io
 import json
 import os
 import sys
+import threading
+from datetime import datetime
 from unittest.mock import patch, mock_open, MagicMock
 import pytest
 
 sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 
 from transcribe import (
-    read_file, extract_audio, summarize, transcribe_audio, get_transcription_for_file,
-    find_input_file, main, parse_args
+    read_file, extract_audio, summarize, transcribe_audio, transcribe_audio_stream,
+    get_transcription_for_file, find_input_file, main, parse_args, split_text,
+    file_fingerprint, get_text_for_file, is_media_header, iter_multipart, format_timestamp,
+    compact_transcription, json_dumps, json_loads, retry_transcription,
+    get_session, SUMMARIZE_SYSTEM_MSG, cache_path
 )
 
 
@@ -16,99 +23,399 @@ MOCK_TRANSCRIPTION_OBJECT = {"segments": [{"start": 0, "text": "Hello"}]}
 MOCK_TEST_TEXT = "Hello World!"
 
 def test_read_file_json():
-    with patch("builtins.open", mock_open(read_data=json.dumps(MOCK_TRANSCRIPTION_OBJECT))) as mock_file:
+    with patch("builtins.open", mock_open(read_data=json.dumps(MOCK_TRANSCRIPTION_OBJECT).encode())) as mock_file:
         transcription, text = read_file("test.json")
         assert transcription is not None
         assert text is None
 
-def test_read_file_text():
-    with patch("builtins.open", mock_open(read_data=MOCK_TEST_TEXT)) as mock_file:
-        transcription, text = read_file("test.txt")
-        assert transcription is None
-        assert text == MOCK_TEST_TEXT
+def test_read_file_text(tmp_path):
+    path = tmp_path / "test.txt"
+    path.write_bytes(MOCK_TEST_TEXT.encode())
+    transcription, text = read_file(str(path))
+    assert transcription is None
+    assert text == MOCK_TEST_TEXT
+
+
+def test_read_file_text_multibyte_at_sniff_boundary(tmp_path):
+    data = "a" * 4095 + "\u00e9 done"
+    path = tmp_path / "test.txt"
+    path.write_bytes(data.encode())
+    transcription, text = read_file(str(path))
+    assert text == data
 
 
-@patch("builtins.open", new_callable=mock_open)
-def test_read_file_binary(mock_open):
-    mock_file = mock_open.return_value.__enter__.return_value
-    mock_file.read.side_effect = UnicodeDecodeError("utf-8", b'\x80\x81\x82', 0, 1, "invalid start byte")
+def test_read_file_is_memoized_until_file_changes(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text(MOCK_TEST_TEXT)
+    read_file.cache_clear()
+    with patch("builtins.open", wraps=open) as spy_open:
+        assert read_file(str(path)) == (None, MOCK_TEST_TEXT)
+        assert read_file(str(path)) == (None, MOCK_TEST_TEXT)
+        assert spy_open.call_count == 1
+        path.write_text("Changed")
+        assert read_file(str(path)) == (None, "Changed")
+        assert spy_open.call_count == 2
 
-    transcription, text = read_file("binary file")
+
+def test_read_file_binary():
+    media = b'\x00\x01\x80\x81\x82' * 1000
+    with patch("builtins.open", mock_open(read_data=media)) as mock_file:
+        transcription, text = read_file("binary file")
 
     assert transcription is None
     assert text is None
+    # Only the sniffed head is read
+    mock_file.return_value.read.assert_called_once_with(4096)
 
-@patch("os.path.exists", return_value=True)
-@patch("os.remove")
+@pytest.mark.parametrize("head, expected", [
+    (b'\x00\x00\x00\x18ftypmp42', True),
+    (b'\x1aE\xdf\xa3\x01\x00\x00\x00', True),
+    (b'OggS\x00\x02', True),
+    (b'ID3\x04\x00', True),
+    (b'Hello World!', False),
+])
+def test_is_media_header(head, expected):
+    assert is_media_header(head) == expected
+
+@patch("builtins.open", new_callable=mock_open, read_data=b'\x00\x00\x00\x18ftypmp42' + b'\x00' * 8000)
+def test_read_file_media_skips_decode(mock_file):
+    transcription, text = read_file("meeting.mp4")
+    assert transcription is None
+    assert text is None
+    mock_file.return_value.read.assert_called_once_with(4096)
+
+@patch("subprocess.Popen")
+def test_extract_audio(mock_popen):
+    proc = extract_audio("my_test_file.mp4")
+    assert proc is mock_popen.return_value
+    command = mock_popen.call_args[0][0]
+    assert command[0] == "ffmpeg"
+    assert "my_test_file.mp4" in command
+    assert command[-1] == "pipe:1"
+    assert "-vn" in command
+    assert "shell" not in mock_popen.call_args.kwargs
+    assert "-filter:a" not in command
+    assert command[command.index("-b:a") + 1] == "16k"
+
+@patch("subprocess.Popen")
+def test_extract_audio_speed(mock_popen):
+    extract_audio("my_test_file.mp4", speed=1.5)
+    command = mock_popen.call_args[0][0]
+    assert command[command.index("-filter:a") + 1] == "atempo=1.5"
+
+@patch("transcribe.get_session")
+@patch("transcribe.extract_audio")
+@patch("transcribe.transcribe_audio_stream")
+@patch("transcribe._write_cache")
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_get_transcription_for_file_speed(mock_fingerprint, mock_write_cache, mock_transcribe_audio, mock_extract_audio, mock_get_session):
+    mock_transcribe_audio.return_value = {"duration": 40.0, "segments": [{"start": 10.0, "end": 20.0, "text": "Hi"}]}
+    transcription = get_transcription_for_file("test.mp4", speed=1.5)
+    mock_extract_audio.assert_called_once_with("test.mp4", speed=1.5, quality="normal")
+    assert transcription["duration"] == 60.0
+    assert transcription["segments"][0]["start"] == 15.0
+    assert transcription["segments"][0]["end"] == 30.0
+
+@patch("transcribe.get_session")
 @patch("subprocess.run")
-def test_extract_audio(mock_run, mock_remove, mock_exists):
-    mock_run.return_value.returncode = 0
-    basename = "my_test_file"
-    output_file = extract_audio(f"{basename}.mp4")
-    assert output_file == f"{basename}.mp3"
-    mock_remove.assert_called_once_with(f"{basename}.mp3")
-    mock_run.assert_called_once()
-
-@patch("requests.post")
+@patch("os.path.getsize", return_value=16)
 @patch("builtins.open", new_callable=mock_open, read_data=b"dummy audio data")
-def test_transcribe_audio(mock_open, mock_post):
+def test_transcribe_audio(mock_open, mock_getsize, mock_run, mock_get_session):
+    mock_post = mock_get_session.return_value.post
     mock_response = MagicMock()
-    mock_response.json.return_value = MOCK_TRANSCRIPTION_OBJECT
+    mock_response.status_code = 200
+    mock_response.content = json.dumps(MOCK_TRANSCRIPTION_OBJECT).encode()
     mock_response.raise_for_status = MagicMock()
     mock_post.return_value = mock_response
 
     transcription = transcribe_audio("test.mp3")
     assert "segments" in transcription
+    mock_run.assert_not_called()  # no ffprobe round-trip
+
+@patch("transcribe.get_session")
+def test_transcribe_audio_stream(mock_get_session):
+    mock_post = mock_get_session.return_value.post
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.content = json.dumps(MOCK_TRANSCRIPTION_OBJECT).encode()
+    mock_post.side_effect = lambda url, data, headers: (b"".join(data), mock_response)[1]
+    proc = MagicMock()
+    proc.stdout = io.BytesIO(b"audio bytes")
+    proc.stderr = io.BytesIO(b"")
+    proc.returncode = 0
+
+    transcription = transcribe_audio_stream(proc)
+    assert "segments" in transcription
+    assert proc.stdout.tell() == len(b"audio bytes")
+
+def test_iter_multipart_escapes_filename():
+    body = b"".join(iter_multipart("xyz", {}, 'my "q"\r\n.mp3', io.BytesIO(b""), "audio/mpeg"))
+    assert b'filename="my %22q%22%0D%0A.mp3"\r\n' in body
+
+def test_iter_multipart():
+    body = b"".join(iter_multipart("xyz", {"model": "whisper-1"}, "a.ogg", io.BytesIO(b"OggS"), "audio/ogg"))
+    assert body == (
+        b'--xyz\r\nContent-Disposition: form-data; name="model"\r\n\r\nwhisper-1\r\n'
+        b'--xyz\r\nContent-Disposition: form-data; name="file"; filename="a.ogg"\r\n'
+        b'Content-Type: audio/ogg\r\n\r\nOggS\r\n--xyz--\r\n'
+    )
+
+@patch("transcribe.get_session")
+def test_transcribe_audio_stream_ffmpeg_error(mock_get_session):
+    mock_post = mock_get_session.return_value.post
+    proc = MagicMock()
+    proc.args = ["ffmpeg", "-i", "bad input.mp4"]
+    proc.stderr = io.BytesIO(b"".join(b"error %d\n" % i for i in range(1000)))
+    proc.returncode = 1
+
+    with pytest.raises(ChildProcessError) as excinfo:
+        transcribe_audio_stream(proc)
+    # Only the tail of a noisy stderr is kept
+    assert "error 999" in str(excinfo.value)
+    assert "error 0\n" not in str(excinfo.value)
+
+@patch("transcribe.get_session")
+def test_transcribe_audio_stream_kills_ffmpeg_on_upload_error(mock_get_session):
+    mock_get_session.return_value.post.side_effect = ConnectionError("reset")
+    proc = MagicMock()
+    with pytest.raises(ConnectionError):
+        transcribe_audio_stream(proc)
+    proc.kill.assert_called_once()
 
+@patch("transcribe.get_session")
 @patch("transcribe.extract_audio")
-@patch("transcribe.transcribe_audio")
-@patch("os.path.exists", return_value=False)
-@patch("os.path.getmtime", return_value=0)
-def test_get_transcription_for_file(mock_getmtime, mock_exists, mock_transcribe_audio, mock_extract_audio):
+@patch("transcribe.transcribe_audio_stream")
+@patch("transcribe._write_cache")
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_get_transcription_for_file(mock_fingerprint, mock_write_cache, mock_transcribe_audio, mock_extract_audio, mock_get_session):
     mock_transcribe_audio.return_value = MOCK_TRANSCRIPTION_OBJECT
-    transcription = get_transcription_for_file("test.mp4", skip_cache=True)
+    transcription = get_transcription_for_file("test.mp4")
     assert "segments" in transcription
+    mock_transcribe_audio.assert_called_once()
 
 
+@patch("transcribe.get_session")
 @patch("transcribe.extract_audio")
-@patch("transcribe.transcribe_audio")
-@patch("os.path.exists", return_value=True)
-@patch("os.path.getmtime", side_effect=[0, 1])
-@patch("builtins.open", new_callable=mock_open, read_data=json.dumps(MOCK_TRANSCRIPTION_OBJECT))
-def test_get_transcription_for_file_with_cache(mock_open, mock_getmtime, mock_exists, mock_transcribe_audio, mock_extract_audio):
-    transcription = get_transcription_for_file("test.mp4", skip_cache=False)
+@patch("transcribe.transcribe_audio_stream")
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_get_transcription_for_file_with_cache(mock_fingerprint, mock_transcribe_audio, mock_extract_audio, mock_get_session, tmp_path):
+    (tmp_path / ".cache").mkdir()
+    (tmp_path / ".cache" / "abc.json.gz").write_bytes(gzip.compress(json.dumps(MOCK_TRANSCRIPTION_OBJECT).encode()))
+    transcription = get_transcription_for_file(str(tmp_path / "test.mp4"), skip_cache=False)
     assert transcription == MOCK_TRANSCRIPTION_OBJECT
     mock_transcribe_audio.assert_not_called()
 
+@patch("transcribe.get_session")
 @patch("transcribe.extract_audio")
-@patch("transcribe.transcribe_audio")
-@patch("os.path.exists", return_value=True)
-@patch("os.path.getmtime", side_effect=[2, 1])  # make cache file older than input_file
-@patch("builtins.open", new_callable=mock_open, read_data=json.dumps(MOCK_TRANSCRIPTION_OBJECT))
-def test_get_transcription_for_file_with_old_cache(mock_open, mock_getmtime, mock_exists, mock_transcribe_audio, mock_extract_audio):
+@patch("transcribe.transcribe_audio_stream")
+@patch("transcribe._write_cache")
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_get_transcription_for_file_skip_cache(mock_fingerprint, mock_write_cache, mock_transcribe_audio, mock_extract_audio, mock_get_session):
     mock_transcribe_audio.return_value = {"segments": [{"start": 0, "text": "Hello"}]}
-    transcription = get_transcription_for_file("test.mp4", skip_cache=False)
+    transcription = get_transcription_for_file("test.mp4", skip_cache=True)
     assert "segments" in transcription
     mock_transcribe_audio.assert_called()
 
-@patch("glob.glob", return_value=['file1.mp4', 'file2.mp4'])  # file2 is newest
-@patch('os.path.getmtime', side_effect=[1, 2])
-@patch('builtins.print')
-def test_find_input_file_with_mp4_files(mock_print, mock_getmtime, mock_glob):
+@patch("transcribe.FFMPEG_SLOTS", new_callable=lambda: threading.BoundedSemaphore(1))
+@patch("transcribe.get_session")
+@patch("transcribe.extract_audio")
+@patch("transcribe.transcribe_audio_stream")
+@patch("transcribe._write_cache")
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_get_transcription_for_file_frees_ffmpeg_slot_before_whisper_returns(
+        mock_fingerprint, mock_write_cache, mock_transcribe_audio, mock_extract_audio, mock_get_session, mock_slots):
+    def transcribe(proc):
+        # ffmpeg has exited, so the next file can start extracting during the Whisper round-trip
+        assert mock_slots.acquire(timeout=5)
+        mock_slots.release()
+        return MOCK_TRANSCRIPTION_OBJECT
+    mock_transcribe_audio.side_effect = transcribe
+    assert get_transcription_for_file("test.mp4") == MOCK_TRANSCRIPTION_OBJECT
+    mock_extract_audio.return_value.wait.assert_called_once()
+
+@patch("transcribe.get_session")
+@patch("transcribe.extract_audio")
+@patch("transcribe.transcribe_audio_stream", return_value=MOCK_TRANSCRIPTION_OBJECT)
+@patch("transcribe._write_cache")
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_get_transcription_for_file_reencodes_audio(mock_fingerprint, mock_write_cache, mock_transcribe_audio, mock_extract_audio, mock_get_session):
+    assert get_transcription_for_file("memo.mp3", quality="low") == MOCK_TRANSCRIPTION_OBJECT
+    mock_extract_audio.assert_called_once_with("memo.mp3", speed=1.0, quality="low")
+    mock_transcribe_audio.assert_called_once()
+
+def test_compact_transcription():
+    verbose = {
+        "task": "transcribe", "language": "english", "duration": 2.0, "text": "Hello",
+        "segments": [{"id": 0, "seek": 0, "start": 0.0, "end": 2.0, "text": "Hello",
+                      "tokens": [50364, 2425], "temperature": 0.0, "avg_logprob": -0.2}],
+    }
+    assert compact_transcription(verbose) == {
+        "language": "english", "duration": 2.0, "text": "Hello",
+        "segments": [{"start": 0.0, "end": 2.0, "text": "Hello"}],
+    }
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_round_trip(use_orjson):
+    import transcribe
+    data = {"segments": [{"start": 1.5, "text": " caf\u00e9"}]}
+    with patch.object(transcribe, "orjson", transcribe.orjson if use_orjson else None):
+        encoded = json_dumps(data)
+        assert isinstance(encoded, bytes)
+        assert json_loads(encoded) == data
+
+def _http_error(status, headers=None):
+    import requests
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+@patch("time.sleep")
+def test_retry_transcription_retries_rate_limits(mock_sleep):
+    transcribe = MagicMock(side_effect=[_http_error(429, {"Retry-After": "7"}), _http_error(503), MOCK_TRANSCRIPTION_OBJECT])
+    assert retry_transcription(transcribe, "test.mp4", speed=1.0) == MOCK_TRANSCRIPTION_OBJECT
+    assert transcribe.call_count == 3
+    transcribe.assert_called_with("test.mp4", speed=1.0)
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [7.0, 4.0]
+
+@patch("time.sleep")
+def test_retry_transcription_does_not_retry_client_errors(mock_sleep):
+    import requests
+    transcribe = MagicMock(side_effect=_http_error(400))
+    with pytest.raises(requests.HTTPError):
+        retry_transcription(transcribe, "test.mp4")
+    transcribe.assert_called_once()
+    mock_sleep.assert_not_called()
+
+@patch("transcribe.OPEN_AI_KEY", "sk-test")
+def test_get_session_does_not_replay_upload_bodies():
+    get_session.cache_clear()
+    session = get_session()
+    get_session.cache_clear()
+    chat_retry = session.get_adapter("https://api.openai.com/v1/chat/completions").max_retries
+    upload_retry = session.get_adapter("https://api.openai.com/v1/audio/transcriptions").max_retries
+    assert chat_retry.is_retry("POST", 429)
+    assert not upload_retry.is_retry("POST", 429)
+
+@patch("transcribe.OPEN_AI_KEY", "sk-test")
+def test_get_session_returns_last_response_after_retries():
+    import requests
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class AlwaysRateLimited(BaseHTTPRequestHandler):
+        hits = 0
+
+        def do_POST(self):
+            type(self).hits += 1
+            self.rfile.read(int(self.headers['Content-Length']))
+            body = b'{"error": {"message": "Rate limit reached"}}'
+            self.send_response(429)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), AlwaysRateLimited)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    get_session.cache_clear()
+    session = get_session()
+    get_session.cache_clear()
+    # Reuse the chat adapter's retry policy against the local server, minus the backoff sleeps
+    adapter = session.get_adapter("https://api.openai.com/v1/chat/completions")
+    adapter.max_retries = adapter.max_retries.new(backoff_factor=0)
+    session.mount("http://", adapter)
+    try:
+        response = session.post(f"http://127.0.0.1:{server.server_port}/v1/chat/completions", json={})
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert AlwaysRateLimited.hits == adapter.max_retries.total + 1
+    assert response.status_code == 429
+    with pytest.raises(requests.HTTPError) as excinfo:
+        response.raise_for_status()
+    assert b"Rate limit reached" in excinfo.value.response.content
+
+@patch("transcribe.OPEN_AI_KEY", None)
+def test_get_session_requires_api_key():
+    get_session.cache_clear()
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY"):
+        get_session()
+
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_cache_path_includes_speed_and_quality(mock_fingerprint):
+    assert cache_path("rec/test.mp4") == os.path.join("rec", ".cache", "abc.json.gz")
+    assert cache_path("rec/test.mp4", speed=1.5) == os.path.join("rec", ".cache", "abc-x1.5.json.gz")
+    assert cache_path("rec/test.mp4", quality="high") == os.path.join("rec", ".cache", "abc-high.json.gz")
+    assert cache_path("rec/test.mp4", speed=2, quality="low") == os.path.join("rec", ".cache", "abc-x2-low.json.gz")
+
+@pytest.mark.parametrize("speed", ["0", "-1", "0.4", "101"])
+def test_parse_args_rejects_invalid_speed(speed):
+    with patch.object(sys, 'argv', ["transcribe.py", "input.mp4", "-s", speed]):
+        with pytest.raises(SystemExit):
+            parse_args()
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"not gzip",
+    gzip.compress(b'{"segments": [')[:-6],
+    gzip.compress(b'{"segments": ['),
+])
+@patch("transcribe.get_session")
+@patch("transcribe.extract_audio")
+@patch("transcribe.transcribe_audio_stream", return_value=MOCK_TRANSCRIPTION_OBJECT)
+@patch("transcribe._write_cache")
+@patch("transcribe.file_fingerprint", return_value="abc")
+def test_get_transcription_for_file_corrupt_cache_is_a_miss(
+        mock_fingerprint, mock_write_cache, mock_transcribe_audio, mock_extract_audio, mock_get_session, tmp_path, content):
+    (tmp_path / ".cache").mkdir()
+    (tmp_path / ".cache" / "abc.json.gz").write_bytes(content)
+    assert get_transcription_for_file(str(tmp_path / "test.mp4")) == MOCK_TRANSCRIPTION_OBJECT
+    mock_transcribe_audio.assert_called_once()
+
+def test_file_fingerprint(tmp_path):
+    media = tmp_path / "meeting.mp4"
+    media.write_bytes(b"\x00" * 100)
+    fingerprint = file_fingerprint(str(media))
+    os.utime(media, (0, 0))
+    assert file_fingerprint(str(media)) == fingerprint
+    media.write_bytes(b"\x00" * 101)
+    assert file_fingerprint(str(media)) != fingerprint
+
+@patch("transcribe.get_session")
+@patch("transcribe.extract_audio")
+@patch("transcribe.transcribe_audio_stream", return_value=MOCK_TRANSCRIPTION_OBJECT)
+def test_get_transcription_for_file_cache_round_trip(mock_transcribe_audio, mock_extract_audio, mock_get_session, tmp_path):
+    media = tmp_path / "meeting.mp4"
+    media.write_bytes(b"media")
+    # Run the background cache write inline
+    with patch("transcribe.EXECUTOR.submit", side_effect=lambda fn, *args: fn(*args)):
+        get_transcription_for_file(str(media))
+    assert get_transcription_for_file(str(media)) == MOCK_TRANSCRIPTION_OBJECT
+    mock_transcribe_audio.assert_called_once()
+
+def test_find_input_file_with_mp4_files(tmp_path, monkeypatch):
+    for mtime, name in [(1, 'file1.mp4'), (2, 'file2.mp4'), (3, 'notes.txt')]:
+        (tmp_path / name).write_bytes(b"")
+        os.utime(tmp_path / name, (mtime, mtime))
+    (tmp_path / 'dir.mp4').mkdir()
+    monkeypatch.chdir(tmp_path)
     result = find_input_file()
-    assert result == 'file2.mp4'
+    assert result == 'file2.mp4'  # newest .mp4 file
 
-@patch("glob.glob", return_value=[])
-def test_find_input_file_no_mp4_files(mock_glob):
+def test_find_input_file_no_mp4_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
     with pytest.raises(FileNotFoundError):
         find_input_file()
 
-@patch("requests.post")
-def test_summarize(mock_post):
+@patch("transcribe.get_session")
+def test_summarize(mock_get_session):
+    mock_post = mock_get_session.return_value.post
     mock_response = MagicMock()
-    mock_response.json.return_value = {
+    mock_response.content = json.dumps({
         'choices': [{'message': {'content': MOCK_TEST_TEXT}}]
-    }
+    }).encode()
     mock_response.raise_for_status = MagicMock()
     mock_post.return_value = mock_response
     summary = summarize("text")
@@ -116,36 +423,133 @@ def test_summarize(mock_post):
     assert summary == MOCK_TEST_TEXT
     mock_post.assert_called_once()
 
-@patch("requests.post")
-def test_summarize_with_extra_prompt(mock_post):
+@patch("transcribe.get_session")
+def test_summarize_with_extra_prompt(mock_get_session):
+    mock_post = mock_get_session.return_value.post
     mock_response = MagicMock()
-    mock_response.json.return_value = {
+    mock_response.content = json.dumps({
         'choices': [{'message': {'content': MOCK_TEST_TEXT}}]
-    }
+    }).encode()
     mock_response.raise_for_status = MagicMock()
     mock_post.return_value = mock_response
     summary = summarize("text", "extra")
 
     assert summary == MOCK_TEST_TEXT
     mock_post.assert_called_once()
+    messages = mock_post.call_args.kwargs["json"]["messages"]
+    assert messages[0] is SUMMARIZE_SYSTEM_MSG
+    assert messages[1:] == [{'role': 'user', 'content': "text"}, {'role': 'system', 'content': "extra"}]
+
+def test_split_text():
+    text = "".join(f"[0:00:{i:02d}] line {i}\n" for i in range(20))
+    chunks = split_text(text, 4)
+    assert len(chunks) == 4
+    assert "".join(chunks) == text
+    assert all(chunk.endswith("\n") for chunk in chunks)
+
+@patch("transcribe.SUMMARY_CHUNK_THRESHOLD", 10)
+@patch("transcribe.get_session")
+def test_summarize_long_text_in_chunks(mock_get_session):
+    mock_post = mock_get_session.return_value.post
+    mock_response = MagicMock()
+    mock_response.content = json.dumps({
+        'choices': [{'message': {'content': MOCK_TEST_TEXT}}]
+    }).encode()
+    mock_post.return_value = mock_response
+    text = "".join(f"line {i}\n" for i in range(20))
+    summary = summarize(text)
+
+    assert summary == MOCK_TEST_TEXT
+    # One call per chunk plus the final reduce
+    assert mock_post.call_count == 5
+
+@patch("transcribe.SUMMARY_CHUNK_THRESHOLD", 10)
+@patch("transcribe.get_session")
+def test_summarize_chunks_all_carry_header(mock_get_session):
+    mock_post = mock_get_session.return_value.post
+    mock_response = MagicMock()
+    mock_response.content = json.dumps({
+        'choices': [{'message': {'content': MOCK_TEST_TEXT}}]
+    }).encode()
+    mock_post.return_value = mock_response
+    header = "Filename: 2024-01-01.mp4\nDate: 2024-01-01\n\n"
+    text = header + "".join(f"[0:00:{i:02d}] line {i}\n" for i in range(20))
+    summarize(text)
+
+    user_messages = [call.kwargs["json"]["messages"][1]["content"] for call in mock_post.call_args_list]
+    assert len(user_messages) == 5
+    assert all(message.startswith(header) for message in user_messages)
+    assert all(message.count("Date:") == 1 for message in user_messages)
+
+@patch("transcribe.read_file")
+def test_get_text_for_file(mock_read_file):
+    mock_read_file.return_value = ({"segments": [
+        {"start": 0, "text": " Hello"},
+        {"start": 3725.5, "text": " World"},
+    ]}, None)
+    text = get_text_for_file("2024-01-01_01-01-01.json")
+    assert text == (
+        "Filename: 2024-01-01_01-01-01.json\nDate: 2024-01-01\n\n"
+        "[0:00:00]  Hello\n"
+        "[1:02:05]  World\n"
+    )
+
+def test_import_does_not_load_requests():
+    import subprocess
+    code = "import sys, transcribe; sys.exit('requests' in sys.modules)"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, "-c", code], cwd=root).returncode == 0
+
+def test_import_skips_dotenv_when_key_is_set():
+    import subprocess
+    code = "import sys, transcribe; sys.exit('dotenv' in sys.modules)"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, OPENAI_API_KEY="sk-test")
+    assert subprocess.run([sys.executable, "-c", code], cwd=root, env=env).returncode == 0
+
+@pytest.mark.parametrize("seconds, expected", [
+    (0, "0:00:00"),
+    (59.9, "0:00:59"),
+    (3725.5, "1:02:05"),
+    (90061, "25:01:01"),
+])
+def test_format_timestamp(seconds, expected):
+    assert format_timestamp(seconds) == expected
+
+@pytest.mark.parametrize("name, expected", [
+    ("2024-01-01_01-01-01.txt", "2024-01-01"),
+    ("2031-12-31 standup.txt", "2031-12-31"),
+    # Unparseable names fall back to the local-time mtime date
+    ("202.txt", datetime.fromtimestamp(12 * 3600).strftime('%Y-%m-%d')),
+    ("20240101.txt", datetime.fromtimestamp(12 * 3600).strftime('%Y-%m-%d')),
+])
+@patch("os.path.getmtime", return_value=12 * 3600)
+@patch("transcribe.read_file")
+def test_get_text_for_file_date(mock_read_file, mock_getmtime, name, expected):
+    mock_read_file.return_value = (MOCK_TRANSCRIPTION_OBJECT, None)
+    assert f"Date: {expected}\n" in get_text_for_file(name)
 
 def test_parse_args_no_arguments():
     test_args = ["transcribe.py"]
     with patch.object(sys, 'argv', test_args):
         args = parse_args()
-        assert args.input_file is None
+        assert args.input_files == []
         assert not args.transcription_only
         assert not args.force
         assert args.prompt == ""
+        assert args.speed == 1.0
+        assert args.quality == "normal"
 
 def test_parse_args_with_arguments():
-    test_args = ["transcribe.py", "input.mp4", "-t", "-f", "-p", "extra prompt"]
+    test_args = ["transcribe.py", "input.mp4", "-t", "-f", "-p", "extra prompt", "-s", "1.5", "-q", "high"]
     with patch.object(sys, 'argv', test_args):
         args = parse_args()
-        assert args.input_file == "input.mp4"
+        assert args.input_files == ["input.mp4"]
         assert args.transcription_only
         assert args.force
         assert args.prompt == "extra prompt"
+        assert args.speed == 1.5
+        assert args.quality == "high"
 
 @patch("os.path.getmtime", return_value=0)
 @patch("os.path.exists", return_value=True)
@@ -158,7 +562,7 @@ def test_main(mock_print, mock_summarize, mock_get_transcription, mock_read_file
     with patch.object(sys, 'argv', test_args):
         main()
         mock_read_file.assert_called_once_with("input.mp4")
-        mock_get_transcription.assert_called_once_with("input.mp4", skip_cache=False)
+        mock_get_transcription.assert_called_once_with("input.mp4", skip_cache=False, speed=1.0, quality="normal")
         mock_summarize.assert_called_once()
 
 @patch("os.path.getmtime", return_value=0)
@@ -173,5 +577,40 @@ def test_main_transcribe_only(mock_print, mock_summarize, mock_get_transcription
     with patch.object(sys, 'argv', test_args):
         main()
         mock_read_file.assert_called_once_with(test_filename)
-        mock_get_transcription.assert_called_once_with(test_filename, skip_cache=False)
-        mock_summarize.assert_not_called()
\ No newline at end of file
+        mock_get_transcription.assert_called_once_with(test_filename, skip_cache=False, speed=1.0, quality="normal")
+        mock_summarize.assert_not_called()
+
+@patch("os.path.getmtime", return_value=0)
+@patch("transcribe.read_file", return_value=(None, None))
+@patch("transcribe.get_transcription_for_file", return_value=MOCK_TRANSCRIPTION_OBJECT)
+@patch("transcribe.summarize", return_value="Summary")
+@patch('builtins.print')
+def test_main_batch(mock_print, mock_summarize, mock_get_transcription, mock_read_file, mock_getmtime):
+    test_args = ["transcribe.py", "a.mp4", "b.mp4", "c.mp4"]
+    with patch.object(sys, 'argv', test_args):
+        main()
+        assert mock_get_transcription.call_count == 3
+        assert mock_summarize.call_count == 3
+        printed = [call.args[0] for call in mock_print.call_args_list]
+        assert [line.splitlines()[0] for line in printed] == ["# a.mp4", "# b.mp4", "# c.mp4"]
+
+@patch("os.path.getmtime", return_value=0)
+@patch("transcribe.read_file", return_value=(None, None))
+@patch("transcribe.get_transcription_for_file")
+@patch("transcribe.summarize", return_value="Summary")
+@patch('builtins.print')
+def test_main_batch_continues_past_failed_file(mock_print, mock_summarize, mock_get_transcription, mock_read_file, mock_getmtime):
+    def transcribe(input_file, **kwargs):
+        if input_file == "bad.mp4":
+            raise RuntimeError("corrupt recording")
+        return MOCK_TRANSCRIPTION_OBJECT
+    mock_get_transcription.side_effect = transcribe
+    test_args = ["transcribe.py", "good1.mp4", "bad.mp4", "good2.mp4"]
+    with patch.object(sys, 'argv', test_args), pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 1
+    printed = [call.args[0] for call in mock_print.call_args_list]
+    assert [line.splitlines()[0] for line in printed] == ["# good1.mp4", "# bad.mp4", "# good2.mp4"]
+    assert "Summary" in printed[0] and "Summary" in printed[2]
+    assert "corrupt recording" in printed[1]
+    assert mock_summarize.call_count == 2
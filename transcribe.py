@@ -1,202 +1,543 @@
 #!/usr/bin/env python3
 import argparse
-import glob
+import codecs
+import collections
+import functools
+import gzip
+import hashlib
 import json
 import logging
 import os
+import re
+import shlex
 import subprocess
-from datetime import datetime, timedelta
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from multiprocessing.util import LOGGER_NAME
 
-import dotenv
-import requests
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-dotenv.load_dotenv()
+# Skip importing dotenv and walking up for a .env when the shell already provides the key
+if not os.environ.get('OPENAI_API_KEY'):
+    import dotenv
+    dotenv.load_dotenv()
 
 LOG = logging.getLogger('krets')
-OPEN_AI_KEY = os.environ.get('OPENAI_API_KEY')
-OPEN_AI_MODEL = os.environ.get('OPEN_AI_MODEL', 'gpt-4o-mini')
-OPEN_AI_WHISPER_MODEL = os.environ.get('OPEN_AI_MODEL', 'whisper-1')
-
-
-def extract_audio(input_file):
-    base_name = os.path.splitext(os.path.basename(input_file))[0]
-    opus_file = f"{base_name}.opus"
-    ogg_file = f"{base_name}.ogg"
-    for path in [opus_file, ogg_file]:
-        if os.path.exists(path):
-            os.remove(path)
-
-    steps = [
-        (
-            "Extracting Audio",
-            f"ffmpeg -i {input_file} -acodec libopus -b:a 16k -ac 1 -ar 16000 {opus_file}"
+env = os.environ
+OPEN_AI_KEY = env.get('OPENAI_API_KEY')
+OPEN_AI_MODEL = env.get('OPEN_AI_MODEL', 'gpt-4o-mini')
+OPEN_AI_WHISPER_MODEL = env.get('OPEN_AI_WHISPER_MODEL', 'whisper-1')
+# Transcripts longer than this are summarized in parallel chunks, then reduced
+SUMMARY_CHUNK_THRESHOLD = 48000
+SUMMARY_WORKERS = 4
+BATCH_HTTP_WORKERS = 8
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+UPLOAD_ATTEMPTS = 4
+# Bytes hashed from each end of an input file to key the transcription cache
+CACHE_SAMPLE_SIZE = 1 << 20
+UPLOAD_CHUNK_SIZE = 1 << 16
+STDERR_TAIL_LINES = 50
+READ_CACHE_SIZE = 32
+# Range ffmpeg's atempo filter accepts
+ATEMPO_MIN = 0.5
+ATEMPO_MAX = 100.0
+# Opus bitrates for 16 kHz mono speech; Whisper resamples to 16 kHz so higher sample rates are wasted
+AUDIO_BITRATES = {'low': '12k', 'normal': '16k', 'high': '32k'}
+# Recordings named like "2024-01-31_10-00-00.mp4" carry their meeting date
+DATE_PREFIX_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})')
+# "Filename: ...\nDate: ...\n\n" block that get_text_for_file puts ahead of a transcript
+TRANSCRIPT_HEADER_RE = re.compile(r'Filename: [^\n]*\nDate: [^\n]*\n\n')
+# Leading bytes of common audio/video containers: WAV/AVI, Ogg, MP3, Matroska/WebM, FLAC
+MEDIA_SIGNATURES = (b'RIFF', b'OggS', b'ID3', b'\x1aE\xdf\xa3', b'fLaC')
+
+SUMMARIZE_SYSTEM_MSG = {
+    'role': 'system',
+    'content':
+        'This is a transcription summarizer. You will organize, and clarify the important points. '
+        'Translate everything to english. '
+        'Greetings and well-wishes are irrelevant. Do not include this information. '
+        'All output will be markdown. '
+        "Don't drop any important points. "
+        "Prefer unordered lists. "
+        "Use subheadings instead of bold or italic. "
+        'The top-line header should be the date in Y-m-d format. '
+}
+
+EXECUTOR = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS)
+# Each ffmpeg encoder is single-threaded; a slot is held only while ffmpeg runs, so the next
+# file starts extracting while the previous one waits on Whisper
+FFMPEG_SLOTS = threading.BoundedSemaphore(max(1, (os.cpu_count() or 2) // 2))
+
+
+def json_loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def json_dumps(obj):
+    # Compact UTF-8 bytes either way, so cache files match whichever parser wrote them
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    if not OPEN_AI_KEY:
+        raise RuntimeError("OPENAI_API_KEY is not set; add it to the environment or a .env file.")
+    # requests (urllib3, SSL) is imported on first use so --help and cached/text runs skip it
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # Shared keep-alive connection pool for all OpenAI calls. Every call goes to one host, so
+    # pool_maxsize must cover the busiest case: a batch's uploads and summaries plus chunked summaries
+    session = requests.Session()
+    session.headers['Authorization'] = f"Bearer {OPEN_AI_KEY}"
+    pool_maxsize = 2 * BATCH_HTTP_WORKERS + SUMMARY_WORKERS
+    session.mount('https://', HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=1.0,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['POST']),
+            respect_retry_after_header=True,
+            # Hand back the last 429/5xx so raise_for_status() raises HTTPError with OpenAI's body
+            raise_on_status=False,
         ),
-        (
-            "Copying Audio",
-            f"ffmpeg -i {opus_file} -acodec copy {ogg_file}"
-        )
-    ]
-    for msg, command in steps:
-        LOG.info(f"{msg}: {command}")
-        result = subprocess.run(command, shell=True, text=True, capture_output=True)
-        if result.returncode != 0:
-            raise ChildProcessError(f"Error running command: {command}\n{result.stderr}")
-    return ogg_file
-
-
-def get_audio_duration(audio_file):
-    command = f"ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 {audio_file}"
-    result = subprocess.run(command, shell=True, text=True, capture_output=True)
-    if result.returncode != 0:
-        raise ChildProcessError(f"Error running command: {command}\n{result.stderr}")
-    return float(result.stdout.strip())
-
-
-def transcribe_audio(audio_file):
-    file_size = os.path.getsize(audio_file)
-    duration = get_audio_duration(audio_file)
-    LOG.info("Transcribing with whisper API (%d bytes; %.1f seconds)", file_size, duration)
+    ))
+    # Upload bodies are one-shot streams urllib3 cannot rewind, so only connection failures are
+    # retried here; retry_transcription re-runs the whole upload on 429/5xx
+    session.mount('https://api.openai.com/v1/audio/', HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=5, backoff_factor=1.0),
+    ))
+    return session
+
+
+def extract_audio(input_file, speed=1.0, quality='normal'):
+    # -vn skips decoding any video stream; only the audio track is needed
+    command = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", input_file, "-vn"]
+    if speed != 1.0:
+        # atempo keeps the pitch, so Whisper still hears natural voices
+        command += ["-filter:a", f"atempo={speed}"]
+    command += ["-acodec", "libopus", "-b:a", AUDIO_BITRATES[quality], "-ac", "1", "-ar", "16000", "-f", "ogg", "pipe:1"]
+    LOG.info(f"Extracting Audio: {shlex.join(command)}")
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1 << 20)
+
+
+def iter_multipart(boundary, fields, filename, fileobj, content_type):
+    # Percent-encode the characters that would break the quoted header, as urllib3 does
+    filename = filename.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+    for name, value in fields.items():
+        yield f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+    yield (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode()
+    sent = 0
+    for chunk in iter(lambda: fileobj.read(UPLOAD_CHUNK_SIZE), b''):
+        sent += len(chunk)
+        yield chunk
+    LOG.debug("Uploaded %d bytes of %s", sent, filename)
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+
+def _post_transcription(filename, fileobj, content_type):
     url = 'https://api.openai.com/v1/audio/transcriptions'
-    headers = {
-        'Authorization': f"Bearer {OPEN_AI_KEY}"
-    }
-
-    files = {
-        'file': open(audio_file, 'rb')
-    }
-
     data = {
         'model': OPEN_AI_WHISPER_MODEL,
         'response_format': 'verbose_json'
     }
 
-    response = requests.post(url, headers=headers, files=files, data=data)
+    # A generator body is sent with chunked transfer encoding, so the audio is never held in memory
+    boundary = uuid.uuid4().hex
+    body = iter_multipart(boundary, data, filename, fileobj, content_type)
+    headers = {'Content-Type': f"multipart/form-data; boundary={boundary}"}
+    response = get_session().post(url, data=body, headers=headers)
+    # Parse the raw bytes; skips requests' charset detection and bytes-to-str decode
     try:
-        data = response.json()
-    except json.decoder.JSONDecodeError:
+        data = json_loads(response.content)
+    except ValueError:
         data = None
-    if data and response.status_code < 200 or response.status_code >= 300:
+    return response, data
+
+
+def _check_transcription_response(response, data):
+    if data and (response.status_code < 200 or response.status_code >= 300):
         LOG.error(data.get("error", {}).get("message", data))
     response.raise_for_status()
+    # verbose_json reports the audio length, so there is no need to ffprobe it up front
+    if data:
+        LOG.info("Transcribed %.1f seconds of audio", data.get('duration', 0))
     return data
 
 
-def summarize(text, extra_prompt=None):
-    LOG.info("Summarizing with GPT")
+def transcribe_audio(audio_file):
+    LOG.info("Transcribing with whisper API (%d bytes)", os.path.getsize(audio_file))
+    # Whisper detects the format from the filename extension
+    with open(audio_file, 'rb') as fh:
+        response, data = _post_transcription(os.path.basename(audio_file), fh, 'application/octet-stream')
+    return _check_transcription_response(response, data)
+
+
+def transcribe_audio_stream(proc):
+    LOG.info("Transcribing with whisper API (streaming from ffmpeg)")
+    # Drain stderr while uploading; a noisy ffmpeg would otherwise fill the pipe and stall stdout
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    drainer = threading.Thread(target=stderr_tail.extend, args=(proc.stderr,), daemon=True)
+    drainer.start()
+    try:
+        response, data = _post_transcription('audio.ogg', proc.stdout, 'audio/ogg')
+    except BaseException:
+        # Don't leave ffmpeg blocked on a pipe nobody reads
+        proc.kill()
+        proc.wait()
+        raise
+    proc.wait()
+    drainer.join()
+    if proc.returncode != 0:
+        stderr = b''.join(stderr_tail).decode(errors='replace')
+        raise ChildProcessError(f"Error running command: {shlex.join(proc.args)}\n{stderr}")
+    return _check_transcription_response(response, data)
+
+
+def _summarize_once(text, extra_prompt=None):
     url = 'https://api.openai.com/v1/chat/completions'
-    headers = {
-        'Authorization': f"Bearer {OPEN_AI_KEY}"
-    }
-    data = {
-        'model': OPEN_AI_MODEL,
-        'messages': [
-            {
-                'role': 'system',
-                'content':
-                    'This is a transcription summarizer. You will organize, and clarify the important points. '
-                    'Translate everything to english. '
-                    'Greetings and well-wishes are irrelevant. Do not include this information. '
-                    'All output will be markdown. '
-                    "Don't drop any important points. "
-                    "Prefer unordered lists. "
-                    "Use subheadings instead of bold or italic. "
-                    'The top-line header should be the date in Y-m-d format. '
-            },
-            {'role': 'user', 'content': text}
-        ],
-    }
+    messages = [SUMMARIZE_SYSTEM_MSG, {'role': 'user', 'content': text}]
     if extra_prompt:
-        data['messages'].append({'role': 'system', 'content': extra_prompt})
-    response = requests.post(url, headers=headers, json=data)
+        messages.append({'role': 'system', 'content': extra_prompt})
+    response = get_session().post(url, json={'model': OPEN_AI_MODEL, 'messages': messages})
     response.raise_for_status()
-    result = response.json()
+    result = json_loads(response.content)
     return result['choices'][0]['message']['content']
 
 
-def get_transcription_for_file(input_file, skip_cache=False):
-    basename = os.path.basename(input_file)
-    dirname = os.path.dirname(input_file)
-    base_basename = os.path.splitext(basename)[0]
-    cached_transcription = os.path.join(dirname, f".{base_basename}.json")
-    input_mtime = os.path.getmtime(input_file)
-    cache_mtime = os.path.getmtime(cached_transcription) if os.path.exists(cached_transcription) else 0
+def split_text(text, parts):
+    lines = text.splitlines(keepends=True)
+    target = len(text) / parts
+    chunks = []
+    current = []
+    size = 0
+    for line in lines:
+        if current and size + len(line) > target and len(chunks) < parts - 1:
+            chunks.append(''.join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def summarize(text, extra_prompt=None):
+    if len(text) <= SUMMARY_CHUNK_THRESHOLD:
+        LOG.info("Summarizing with GPT")
+        return _summarize_once(text, extra_prompt)
+
+    # Every chunk and the reduce step need the Filename/Date header, or they invent a date
+    header_match = TRANSCRIPT_HEADER_RE.match(text)
+    header = header_match.group(0) if header_match else ''
+    chunks = split_text(text[len(header):], SUMMARY_WORKERS)
+    LOG.info("Summarizing %d chunks in parallel with GPT", len(chunks))
+    futures = [EXECUTOR.submit(_summarize_once, header + chunk, extra_prompt) for chunk in chunks]
+    partials = [future.result() for future in futures]
+    LOG.info("Combining %d partial summaries", len(partials))
+    return _summarize_once(header + "\n\n".join(partials), extra_prompt)
+
+
+def file_fingerprint(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        digest.update(size.to_bytes(8, 'little'))
+        digest.update(fh.read(CACHE_SAMPLE_SIZE))
+        if size > CACHE_SAMPLE_SIZE:
+            fh.seek(max(CACHE_SAMPLE_SIZE, size - CACHE_SAMPLE_SIZE))
+            digest.update(fh.read())
+    return digest.hexdigest()
+
+
+def _write_cache(cached_transcription, transcription):
+    try:
+        os.makedirs(os.path.dirname(cached_transcription), exist_ok=True)
+        partial = f"{cached_transcription}.tmp"
+        with gzip.open(partial, 'wb') as fh:
+            fh.write(json_dumps(transcription))
+        os.replace(partial, cached_transcription)
+    except OSError:
+        LOG.exception("Failed to cache transcription to: %s", cached_transcription)
+
+
+def rescale_timestamps(transcription, speed):
+    # Map timestamps of sped-up audio back onto the original media
+    if 'duration' in transcription:
+        transcription['duration'] *= speed
+    for seg in transcription.get('segments', []):
+        seg['start'] *= speed
+        if 'end' in seg:
+            seg['end'] *= speed
+    return transcription
+
+
+def compact_transcription(transcription):
+    # verbose_json carries per-segment token ids and decoder stats that nothing downstream reads
+    compact = {key: transcription[key] for key in ('text', 'language', 'duration') if key in transcription}
+    compact['segments'] = [
+        {key: seg[key] for key in ('start', 'end', 'text') if key in seg}
+        for seg in transcription.get('segments', [])
+    ]
+    return compact
+
+
+def _release_ffmpeg_slot(proc):
+    proc.wait()
+    FFMPEG_SLOTS.release()
 
-    if skip_cache or (cache_mtime < input_mtime):
-        audio_file = extract_audio(input_file)
-        transcription = transcribe_audio(audio_file)
+
+def _transcribe_extracted(input_file, speed=1.0, quality='normal'):
+    FFMPEG_SLOTS.acquire()
+    try:
+        proc = extract_audio(input_file, speed=speed, quality=quality)
+    except BaseException:
+        FFMPEG_SLOTS.release()
+        raise
+    threading.Thread(target=_release_ffmpeg_slot, args=(proc,), daemon=True).start()
+    return transcribe_audio_stream(proc)
+
+
+def retry_transcription(transcribe, *args, **kwargs):
+    import requests
+
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        try:
+            return transcribe(*args, **kwargs)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in RETRY_STATUSES or attempt == UPLOAD_ATTEMPTS:
+                raise
+            retry_after = e.response.headers.get('Retry-After', '')
+            delay = float(retry_after) if retry_after.isdigit() else 2.0 ** attempt
+            LOG.warning("Whisper returned %d; retrying in %.0f seconds (attempt %d of %d)",
+                        status, delay, attempt + 1, UPLOAD_ATTEMPTS)
+            time.sleep(delay)
+
+
+def _read_cache(cached_transcription):
+    # Opening directly avoids a separate exists() stat and cannot race with a concurrent write
+    try:
+        with gzip.open(cached_transcription, 'rb') as fh:
+            transcription = json_loads(fh.read())
+    except FileNotFoundError:
+        return None
+    except (gzip.BadGzipFile, EOFError, ValueError) as e:
+        # Hash-named files are hard to find by hand, so a corrupt entry is simply rebuilt
+        LOG.warning("Ignoring unreadable cached transcription %s: %s", cached_transcription, e)
+        return None
+    LOG.info("Loaded cached transcription from: %s", cached_transcription)
+    return transcription
+
+
+def cache_path(input_file, speed=1.0, quality='normal'):
+    # Sped-up or re-encoded audio yields a different transcript, so each gets its own cache entry
+    name = file_fingerprint(input_file)
+    if speed != 1.0:
+        name += f"-x{speed:g}"
+    if quality != 'normal':
+        name += f"-{quality}"
+    return os.path.join(os.path.dirname(input_file), '.cache', f"{name}.json.gz")
+
+
+def get_transcription_for_file(input_file, skip_cache=False, speed=1.0, quality='normal'):
+    cached_transcription = cache_path(input_file, speed=speed, quality=quality)
+
+    transcription = None if skip_cache else _read_cache(cached_transcription)
+    if transcription is None:
+        get_session()  # fail on a missing API key before spending an ffmpeg pass
+        # Always re-encode: 16 kbps Opus uploads several times fewer bytes than typical mp3/m4a,
+        # the encode overlaps the upload, and --quality applies to every input
+        transcription = retry_transcription(_transcribe_extracted, input_file, speed=speed, quality=quality)
+        transcription = compact_transcription(transcription)
+        if speed != 1.0:
+            transcription = rescale_timestamps(transcription, speed)
         LOG.debug("Caching transcription to: %s", cached_transcription)
-        with open(cached_transcription, 'w') as fh:
-            json.dump(transcription, fh)
-    else:
-        LOG.info("Loading cached transcription from: %s", cached_transcription)
-        with open(cached_transcription, 'r') as fh:
-            transcription = json.load(fh)
+        # Write in the background so summarizing can start immediately
+        EXECUTOR.submit(_write_cache, cached_transcription, transcription)
     return transcription
 
 
 def find_input_file():
-    mp4_files = sorted(glob.glob("*.mp4"), key=os.path.getmtime, reverse=True)
-    if mp4_files:
-        input_file = mp4_files[0]
+    with os.scandir('.') as entries:
+        latest = max(
+            ((e.stat().st_mtime, e.name) for e in entries if e.name.endswith('.mp4') and e.is_file()),
+            default=None
+        )
+    if latest:
+        input_file = latest[1]
         LOG.info(f"No input_file specified. Using the latest .mp4 file: {input_file}")
     else:
         raise FileNotFoundError("No .mp4 files found in the current directory.")
     return input_file
 
 
+def is_media_header(head):
+    # MP4/MOV/M4A carry "ftyp" after a 4-byte box size
+    return head[4:8] == b'ftyp' or head.startswith(MEDIA_SIGNATURES)
+
+
+def memoize_by_stat(func):
+    # Cache results per (path, mtime, size) so a file edited on disk is always re-read
+    cache = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return func(path)
+        key = (path, st.st_mtime_ns, st.st_size)
+        with lock:
+            if key in cache:
+                return cache[key]
+        result = func(path)
+        with lock:
+            if len(cache) >= READ_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+            cache[key] = result
+        return result
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
+@memoize_by_stat
 def read_file(input_file):
     transcription = None
     text = None
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
+        with open(input_file, 'rb') as f:
             if input_file.endswith('.json'):
-                transcription = json.load(f)
+                transcription = json_loads(f.read())
                 LOG.info("Input file appears to be a JSON file.")
             else:
-                data = f.read(1024)
-                data += f.read()
+                # Sniff the head first so media files are rejected without reading them in full
+                head = f.read(4096)
+                if is_media_header(head):
+                    LOG.info("Input file appears to be audio/video.")
+                    return transcription, text
+                codecs.getincrementaldecoder('utf-8')().decode(head)
+                # Re-read the 4 KiB head rather than concatenating, which would copy the whole file
+                f.seek(0)
+                text = f.read().decode('utf-8')
                 LOG.info("Input file appears to be plaintext.")
-                text = data
     except UnicodeDecodeError:
         # Binary file, not transcription or text can be extracted
         pass
     return transcription, text
 
 
+def atempo_factor(value):
+    speed = float(value)
+    if not ATEMPO_MIN <= speed <= ATEMPO_MAX:
+        raise argparse.ArgumentTypeError(f"speed must be between {ATEMPO_MIN:g} and {ATEMPO_MAX:g}")
+    return speed
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Transcribe and summarize audio from an FFmpeg-compatible file.")
-    parser.add_argument("input_file", nargs="?", help="Path to file (.txt, .json, .mp4, .mkv, .mov)")
+    parser.add_argument("input_files", nargs="*", help="Path(s) to file (.txt, .json, .mp4, .mkv, .mov)")
     parser.add_argument("-t", "--transcription-only", action="store_true", help="Only Transcribe.")
     parser.add_argument("-f", "--force", action="store_true", help="Force re-caching transcription.")
     parser.add_argument("-p", "--prompt", default="", help="Extra prompt to add to the summary directive.")
+    parser.add_argument("-s", "--speed", type=atempo_factor, default=1.0,
+                        help="Speed audio up before transcribing (e.g. 1.5) to cut Whisper time and cost.")
+    parser.add_argument("-q", "--quality", choices=AUDIO_BITRATES, default="normal",
+                        help="Audio bitrate sent to Whisper (low: 12k, normal: 16k, high: 32k).")
     return parser.parse_args()
 
 
-def main():
-    args = parse_args()
-    input_file = args.input_file if args.input_file else find_input_file()
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def get_text_for_file(input_file, skip_cache=False, speed=1.0, quality='normal'):
     base_name = os.path.basename(input_file)
     transcription, text = read_file(input_file)
 
     if text is None and transcription is None:
-        transcription = get_transcription_for_file(input_file, skip_cache=args.force)
+        transcription = get_transcription_for_file(
+            input_file, skip_cache=skip_cache, speed=speed, quality=quality
+        )
 
-    if base_name.startswith("20") and base_name[:4].isdigit() and len(base_name) > 10:
-        assumed_date = ''.join(base_name[:10])
+    date_match = DATE_PREFIX_RE.match(base_name)
+    if date_match:
+        assumed_date = date_match.group(1)
     else:
         assumed_date = datetime.fromtimestamp(os.path.getmtime(input_file)).strftime('%Y-%m-%d')
 
     if transcription:
-        text = f"Filename: {base_name}\nDate: {assumed_date}\n\n"
-        for seg in transcription['segments']:
-            text += f"[{timedelta(seconds=seg['start'])}] {seg['text']}\n"
+        segments = transcription['segments']
+        starts = [seg['start'] for seg in segments]
+        lines = [seg['text'] for seg in segments]
+        parts = [f"Filename: {base_name}\nDate: {assumed_date}\n\n"]
+        parts.extend(f"[{format_timestamp(start)}] {line}\n" for start, line in zip(starts, lines))
+        text = ''.join(parts)
+    return text
 
+
+def build_report(text, args):
     if args.transcription_only:
-        print(f"Transcription:\n{text}")
-    else:
-        summary = summarize(text, args.prompt)
-        print(f"Summary from chatGPT:\n{summary}\n")
+        return f"Transcription:\n{text}"
+    summary = summarize(text, args.prompt)
+    return f"Summary from chatGPT:\n{summary}\n"
+
+
+def main():
+    args = parse_args()
+    input_files = args.input_files if args.input_files else [find_input_file()]
+    options = dict(skip_cache=args.force, speed=args.speed, quality=args.quality)
+
+    if len(input_files) == 1:
+        print(build_report(get_text_for_file(input_files[0], **options), args))
+        return
+
+    # ffmpeg concurrency is capped by FFMPEG_SLOTS, so both pools can be sized for network waits
+    workers = min(len(input_files), BATCH_HTTP_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as transcribers, \
+            ThreadPoolExecutor(max_workers=BATCH_HTTP_WORKERS) as reporters:
+        pending = {transcribers.submit(get_text_for_file, f, **options): i for i, f in enumerate(input_files)}
+        reports = [None] * len(input_files)
+        # Summarize each file as soon as its transcription lands, whatever the input order
+        for future in as_completed(pending):
+            index = pending[future]
+            if future.exception() is None:
+                reports[index] = reporters.submit(build_report, future.result(), args)
+            else:
+                # Keep the failed future; its error is reported below without stopping the batch
+                reports[index] = future
+        failed = False
+        for input_file, report in zip(input_files, reports):
+            try:
+                output = report.result()
+            except Exception as e:
+                LOG.error("Failed to process %s: %s", input_file, e)
+                output = f"Error: {e}\n"
+                failed = True
+            print(f"# {input_file}\n{output}")
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == '__main__':